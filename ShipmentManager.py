@@ -10,6 +10,10 @@ import sqlite3
 import hashlib
 import logging
 import json
+import string
+import functools
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from typing import List, Dict, Any, Optional, Tuple
 from decimal import Decimal, ROUND_HALF_UP
@@ -21,33 +25,279 @@ from PyQt6.QtWidgets import (
     QTextEdit, QSplitter, QFrame, QMessageBox, QHeaderView, QStyle,
     QStyleFactory, QMenuBar, QMenu, QStatusBar, QToolBar, QCheckBox,
     QGroupBox, QFormLayout, QScrollArea, QFileDialog,
-    QTextBrowser, QTabWidget
+    QTextBrowser, QTabWidget, QTableView, QTreeView, QStackedWidget
 )
 from PyQt6.QtPrintSupport import QPrintDialog, QPrinter
-from PyQt6.QtCore import Qt, QDateTime, pyqtSignal, QTimer
+from PyQt6.QtCore import (
+    Qt, QDateTime, pyqtSignal, QTimer, QAbstractTableModel, QAbstractItemModel,
+    QModelIndex, QObject, QRunnable, QThreadPool
+)
 from PyQt6.QtGui import QAction, QIcon, QFont, QPalette, QColor, QKeySequence
 
+from app_logging import setup_logging
+
+
+# Display formats for dates and timestamps
+_DATE_FMT = "%d/%m/%Y"
+_DATETIME_FMT = "%d/%m/%Y %H:%M"
+_TIMESTAMP_FMT = "%d/%m/%Y %H:%M:%S"
+
+# List queries; the text is the same on every load, so each thread's
+# connection reuses the prepared statement from its statement cache
+_SQL_SHIPMENTS = '''
+    SELECT s.id, s.created_at, s.notes,
+           COUNT(DISTINCT sp.product_id) as product_count,
+           COUNT(DISTINCT fp.farmer_id) as farmer_count,
+           COALESCE(SUM(fp.total_paid), 0) as total_paid
+    FROM shipments s
+    LEFT JOIN shipment_products sp ON s.id = sp.shipment_id
+    LEFT JOIN farmer_purchases fp ON s.id = fp.shipment_id
+    GROUP BY s.id
+    ORDER BY s.created_at DESC
+'''
+
+# Aggregate each child table on its own before joining, so the
+# joins can't multiply rows and inflate the sums
+_SQL_PRODUCTS = '''
+    WITH sp_agg AS (
+        SELECT product_id, SUM(quantity) as quantity, SUM(subtotal) as cost
+        FROM shipment_products
+        GROUP BY product_id
+    ),
+    fp_agg AS (
+        SELECT product_id, SUM(quantity) as quantity
+        FROM farmer_purchases
+        GROUP BY product_id
+    ),
+    r_agg AS (
+        SELECT product_id, SUM(quantity) as quantity
+        FROM returns
+        GROUP BY product_id
+    )
+    SELECT p.id, p.name, p.created_at,
+           COALESCE(sp.quantity, 0) as total_bought,
+           COALESCE(sp.cost, 0) as total_cost,
+           COALESCE(sp.quantity, 0) - 
+           COALESCE(fp.quantity, 0) - 
+           COALESCE(r.quantity, 0) as current_stock
+    FROM products p
+    LEFT JOIN sp_agg sp ON p.id = sp.product_id
+    LEFT JOIN fp_agg fp ON p.id = fp.product_id
+    LEFT JOIN r_agg r ON p.id = r.product_id
+    ORDER BY p.name
+'''
+
+# Stock levels for every product. Each child table is aggregated on its own before joining, so the joins
+# can't multiply rows and inflate the sums
+_SQL_STOCK = '''
+    WITH bought AS (
+        SELECT product_id, SUM(quantity) as quantity
+        FROM shipment_products
+        GROUP BY product_id
+    ),
+    sold AS (
+        SELECT product_id, SUM(quantity) as quantity
+        FROM farmer_purchases
+        WHERE shipment_id IS NOT NULL
+        GROUP BY product_id
+    ),
+    returned AS (
+        SELECT product_id, SUM(quantity) as quantity
+        FROM returns
+        GROUP BY product_id
+    )
+    SELECT p.id, p.name,
+           COALESCE(b.quantity, 0) as total_bought,
+           COALESCE(s.quantity, 0) as total_sold,
+           COALESCE(b.quantity, 0) - 
+           COALESCE(s.quantity, 0) - 
+           COALESCE(r.quantity, 0) as current_stock
+    FROM products p
+    LEFT JOIN bought b ON p.id = b.product_id
+    LEFT JOIN sold s ON p.id = s.product_id
+    LEFT JOIN returned r ON p.id = r.product_id
+    ORDER BY p.name
+'''
+
+# Receipt templates, parsed once at import and filled in per receipt
+_RECEIPT_CSS_TMPL = string.Template("""
+                body { font-family: Arial, sans-serif; margin: 20px; }
+                .header { text-align: center; margin-bottom: 30px; }
+                .title { font-size: 24px; font-weight: bold; color: $color; }
+                .date { font-size: 12px; color: #666; }
+                .info { margin: 20px 0; }
+                .items { width: 100%; border-collapse: collapse; margin: 20px 0; }
+                .items th, .items td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+                .items th { background-color: #f2f2f2; }
+                .total { font-weight: bold; font-size: 16px; text-align: right; margin-top: 20px; }
+                .footer { margin-top: 40px; font-size: 12px; color: #666; text-align: center; }
+            """)
+
+_RECEIPT_TMPL = string.Template("""
+        <html>
+        <head>
+            <style>$css</style>
+        </head>
+        <body>
+            <div class="header">
+                <div class="title">$title</div>
+                <div class="date">$subtitle</div>
+            </div>
+            $info
+            <table class="items">
+                <thead>
+                    <tr>
+                        <th>Item</th>
+                        <th>Quantity</th>
+                        <th>Unit Price</th>
+                        <th>Subtotal</th>
+                    </tr>
+                </thead>
+                <tbody>
+                    $rows
+                </tbody>
+            </table>
+            
+            <div class="total">
+                Total: DA $total
+            </div>
+            
+            <div class="footer">
+                Thank you for your business!<br>
+                Shipment Management System
+            </div>
+        </body>
+        </html>
+        """)
+
+_RECEIPT_ROW_TMPL = string.Template("""
+                    <tr>
+                        <td>$name</td>
+                        <td>$quantity</td>
+                        <td>DA $unit_price</td>
+                        <td>DA $subtotal</td>
+                    </tr>""")
+
+_RECEIPT_INFO_TMPL = string.Template("""
+            <div class="info">
+                <strong>Shipment Date:</strong> $shipment_date<br>
+                <strong>Notes:</strong> $notes
+            </div>
+            """)
+
+
+def _render_receipt_rows(products: List[Dict[str, Any]]) -> str:
+    """Render receipt line items, joining the pieces once at the end"""
+    parts = []
+    for product in products:
+        parts.append(_RECEIPT_ROW_TMPL.substitute(
+            name=product['name'],
+            quantity=product['quantity'],
+            unit_price=f"{product['unit_price']:.2f}",
+            subtotal=f"{product['subtotal']:.2f}"
+        ))
+    return "".join(parts)
+
+
+@functools.lru_cache(maxsize=8)
+def _receipt_css(color: str) -> str:
+    """Receipt stylesheet for a title color; only a few colors are ever used"""
+    return _RECEIPT_CSS_TMPL.substitute(color=color)
+
+
+@functools.lru_cache(maxsize=4096)
+def _fmt_dt(iso: str, fmt: str) -> str:
+    """Format a stored timestamp for display; list rows often share the same value"""
+    return f"{datetime.fromisoformat(iso):{fmt}}"
+
+
+@contextmanager
+def _batched_table_update(table: QTableWidget):
+    """Suspend repaints, signals and sorting while a table is repopulated"""
+    sorting_enabled = table.isSortingEnabled()
+    table.setUpdatesEnabled(False)
+    table.setSortingEnabled(False)
+    table.blockSignals(True)
+    try:
+        yield table
+    finally:
+        table.blockSignals(False)
+        table.setSortingEnabled(sorting_enabled)
+        table.setUpdatesEnabled(True)
+
+
+class _DeferredRefreshMixin:
+    """Defers a widget's refresh while it is hidden and runs it on the next show"""
+    
+    def _init_deferred_refresh(self, refresh):
+        self._refresh = refresh
+        self._dirty = False
+    
+    def _request_refresh(self):
+        """Refresh now if visible, otherwise mark the widget dirty"""
+        if not self.isVisible():
+            self._dirty = True
+            return
+        self._run_refresh()
+    
+    def _run_refresh(self):
+        self._dirty = False
+        self._refresh()
+    
+    def showEvent(self, event):
+        """Run a refresh that was deferred while the widget was hidden"""
+        super().showEvent(event)
+        if self._dirty:
+            self._run_refresh()
+
 
 class Database:
     """Database management class with SQLite"""
     
     def __init__(self, db_path: str = "shipments.db"):
         self.db_path = db_path
+        self._farmers_cache: Optional[List[Dict[str, Any]]] = None
+        self._products_cache: Optional[List[Dict[str, Any]]] = None
+        # Bumped on every write so views can tell whether their data is stale
+        self.data_version = 0
+        # One connection (and transaction flag) per thread: sqlite3
+        # connections can't be shared across threads by default
+        self._local = threading.local()
         self.init_database()
     
     def get_connection(self) -> sqlite3.Connection:
         """Get database connection with foreign keys enabled"""
-        conn = sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(self.db_path, cached_statements=256)
         conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA synchronous = NORMAL")
         conn.row_factory = sqlite3.Row
         return conn
     
+    def _thread_connection(self) -> sqlite3.Connection:
+        """Long-lived connection for the calling thread, so prepared statements stay cached"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self.get_connection()
+        return conn
+    
+    @property
+    def _in_transaction(self) -> bool:
+        return getattr(self._local, 'in_transaction', False)
+    
+    @_in_transaction.setter
+    def _in_transaction(self, value: bool):
+        self._local.in_transaction = value
+    
     def init_database(self):
         """Initialize database with all tables"""
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
             
+            # WAL lets readers and the writer proceed concurrently; it is
+            # stored in the database file, so setting it once is enough
+            cursor.execute('PRAGMA journal_mode = WAL')
+            
             # Create all tables
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS products (
@@ -134,6 +384,11 @@ class Database:
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_farmer_purchases_shipment_id ON farmer_purchases(shipment_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_farmer_purchases_farmer_id ON farmer_purchases(farmer_id)')
             
+            # Covering indexes for the per-product stock aggregates
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_shipment_products_product_id ON shipment_products(product_id, quantity)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_farmer_purchases_product_id ON farmer_purchases(product_id, shipment_id, quantity)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_returns_product_id ON returns(product_id, quantity)')
+            
             # Insert default admin user if not exists
             password_hash = hashlib.sha256("password123".encode()).hexdigest()
             cursor.execute('''
@@ -179,22 +434,72 @@ class Database:
     
     def execute_query(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
         """Execute SELECT query and return results"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        cursor = self._thread_connection().cursor()
         cursor.execute(query, params)
-        results = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return results
+        return [dict(row) for row in cursor.fetchall()]
     
     def execute_update(self, query: str, params: tuple = ()) -> int:
         """Execute INSERT/UPDATE/DELETE query and return last row ID"""
-        conn = self.get_connection()
+        conn = self._thread_connection()
         cursor = conn.cursor()
-        cursor.execute(query, params)
+        try:
+            cursor.execute(query, params)
+        except Exception:
+            if not self._in_transaction:
+                conn.rollback()
+            raise
+        self.data_version += 1
         last_row_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        if not self._in_transaction:
+            conn.commit()
         return last_row_id
+    
+    def executemany(self, query: str, seq_of_params) -> int:
+        """Execute INSERT/UPDATE/DELETE query for each parameter tuple and return rows affected"""
+        conn = self._thread_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(query, seq_of_params)
+        except Exception:
+            if not self._in_transaction:
+                conn.rollback()
+            raise
+        self.data_version += 1
+        row_count = cursor.rowcount
+        if not self._in_transaction:
+            conn.commit()
+        return row_count
+    
+    @contextmanager
+    def transaction(self):
+        """Hold off committing the enclosed writes until the block completes"""
+        conn = self._thread_connection()
+        self._in_transaction = True
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._in_transaction = False
+    
+    def get_farmers(self) -> List[Dict[str, Any]]:
+        """Return id/name of all farmers, cached until clear_lookup_cache()"""
+        if self._farmers_cache is None:
+            self._farmers_cache = self.execute_query('SELECT id, name FROM farmers ORDER BY name')
+        return self._farmers_cache
+    
+    def get_products(self) -> List[Dict[str, Any]]:
+        """Return id/name of all products, cached until clear_lookup_cache()"""
+        if self._products_cache is None:
+            self._products_cache = self.execute_query('SELECT id, name FROM products ORDER BY name')
+        return self._products_cache
+    
+    def clear_lookup_cache(self):
+        """Drop cached farmer/product lookups after either table changes"""
+        self._farmers_cache = None
+        self._products_cache = None
 
 
 class LoginDialog(QDialog):
@@ -275,12 +580,13 @@ class LoginDialog(QDialog):
             logging.warning(f"Failed login attempt for username: {username}")
 
 
-class ShipmentsWidget(QWidget):
+class ShipmentsWidget(_DeferredRefreshMixin, QWidget):
     """Shipments management widget"""
     
     def __init__(self, db: Database):
         super().__init__()
         self.db = db
+        self._init_deferred_refresh(self._refresh_shipments)
         self.init_ui()
         self.load_shipments()
     
@@ -309,52 +615,47 @@ class ShipmentsWidget(QWidget):
         self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
         self.table.doubleClicked.connect(self.view_shipment)
         
-        # Set column widths
+        # Set column widths; ResizeToContents would re-measure every row on
+        # each setItem, so columns are fitted once per load instead
         header = self.table.horizontalHeader()
-        header.setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
-        header.setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
         header.setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
-        header.setSectionResizeMode(3, QHeaderView.ResizeMode.ResizeToContents)
-        header.setSectionResizeMode(4, QHeaderView.ResizeMode.ResizeToContents)
         
         layout.addWidget(self.table)
         self.setLayout(layout)
     
     def load_shipments(self):
-        """Load shipments from database"""
-        query = '''
-            SELECT s.id, s.created_at, s.notes,
-                   COUNT(DISTINCT sp.product_id) as product_count,
-                   COUNT(DISTINCT fp.farmer_id) as farmer_count,
-                   COALESCE(SUM(fp.total_paid), 0) as total_paid
-            FROM shipments s
-            LEFT JOIN shipment_products sp ON s.id = sp.shipment_id
-            LEFT JOIN farmer_purchases fp ON s.id = fp.shipment_id
-            GROUP BY s.id
-            ORDER BY s.created_at DESC
-        '''
-        
-        shipments = self.db.execute_query(query)
-        
-        self.table.setRowCount(len(shipments))
-        for row, shipment in enumerate(shipments):
-            # ID
-            self.table.setItem(row, 0, QTableWidgetItem(str(shipment['id'])))
-            
-            # Date
-            date_obj = datetime.fromisoformat(shipment['created_at'])
-            date_str = date_obj.strftime("%d/%m/%Y %H:%M")
-            self.table.setItem(row, 1, QTableWidgetItem(date_str))
-            
-            # Products
-            self.table.setItem(row, 2, QTableWidgetItem(f"{shipment['product_count']} products"))
-            
-            # Customers
-            self.table.setItem(row, 3, QTableWidgetItem(f"{shipment['farmer_count']} farmers"))
+        """Load shipments from database, deferring until shown if hidden"""
+        self._request_refresh()
+    
+    def _refresh_shipments(self):
+        """Query shipments and repopulate the table"""
+        shipments = self.db.execute_query(_SQL_SHIPMENTS)
+        
+        with _batched_table_update(self.table):
+            self.table.setRowCount(len(shipments))
+            for row, shipment in enumerate(shipments):
+                # ID
+                self.table.setItem(row, 0, QTableWidgetItem(str(shipment['id'])))
+                
+                # Date
+                date_str = _fmt_dt(shipment['created_at'], _DATETIME_FMT)
+                self.table.setItem(row, 1, QTableWidgetItem(date_str))
+                
+                # Products
+                self.table.setItem(row, 2, QTableWidgetItem(f"{shipment['product_count']} products"))
+                
+                # Customers
+                self.table.setItem(row, 3, QTableWidgetItem(f"{shipment['farmer_count']} farmers"))
+                
+                # Total Paid (display only, so plain float formatting is enough)
+                self.table.setItem(row, 4, QTableWidgetItem(f"{float(shipment['total_paid']):,.2f} DA"))
             
-            # Total Paid
-            total_paid = Decimal(str(shipment['total_paid'])).quantize(Decimal('0.01'))
-            self.table.setItem(row, 4, QTableWidgetItem(f"{total_paid:,.2f} DA"))
+            self.table.resizeColumnsToContents()
+    
+    def refresh(self):
+        """Reload the table after the underlying data has changed"""
+        self.load_shipments()
     
     def add_shipment(self):
         """Open dialog to add new shipment"""
@@ -405,49 +706,42 @@ class ProductsWidget(QWidget):
         self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
         self.table.doubleClicked.connect(self.view_product)
         
+        # Columns are fitted once per load rather than per row
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        
         layout.addWidget(self.table)
         self.setLayout(layout)
     
+    def refresh(self):
+        """Reload the table after the underlying data has changed"""
+        self.load_products()
+    
     def load_products(self):
         """Load products from database with statistics"""
-        query = '''
-            SELECT p.id, p.name, p.created_at,
-                   COALESCE(SUM(sp.quantity), 0) as total_bought,
-                   COALESCE(SUM(sp.subtotal), 0) as total_cost,
-                   COALESCE(SUM(sp.quantity), 0) - 
-                   COALESCE(SUM(fp.quantity), 0) - 
-                   COALESCE(SUM(r.quantity), 0) as current_stock
-            FROM products p
-            LEFT JOIN shipment_products sp ON p.id = sp.product_id
-            LEFT JOIN farmer_purchases fp ON p.id = fp.product_id
-            LEFT JOIN returns r ON p.id = r.product_id
-            GROUP BY p.id
-            ORDER BY p.name
-        '''
+        products = self.db.execute_query(_SQL_PRODUCTS)
         
-        products = self.db.execute_query(query)
-        
-        self.table.setRowCount(len(products))
-        for row, product in enumerate(products):
-            # Name
-            self.table.setItem(row, 0, QTableWidgetItem(product['name']))
-            
-            # Date Added
-            date_obj = datetime.fromisoformat(product['created_at'])
-            date_str = date_obj.strftime("%d/%m/%Y")
-            self.table.setItem(row, 1, QTableWidgetItem(date_str))
-            
-            # Total Bought
-            total_bought = Decimal(str(product['total_bought'])).quantize(Decimal('0.01'))
-            self.table.setItem(row, 2, QTableWidgetItem(f"{total_bought:,.2f}"))
-            
-            # Total Cost
-            total_cost = Decimal(str(product['total_cost'])).quantize(Decimal('0.01'))
-            self.table.setItem(row, 3, QTableWidgetItem(f"{total_cost:,.2f} DA"))
+        with _batched_table_update(self.table):
+            self.table.setRowCount(len(products))
+            for row, product in enumerate(products):
+                # Name
+                self.table.setItem(row, 0, QTableWidgetItem(product['name']))
+                
+                # Date Added
+                date_str = _fmt_dt(product['created_at'], _DATE_FMT)
+                self.table.setItem(row, 1, QTableWidgetItem(date_str))
+                
+                # Total Bought
+                self.table.setItem(row, 2, QTableWidgetItem(f"{float(product['total_bought']):,.2f}"))
+                
+                # Total Cost
+                self.table.setItem(row, 3, QTableWidgetItem(f"{float(product['total_cost']):,.2f} DA"))
+                
+                # Current Stock
+                self.table.setItem(row, 4, QTableWidgetItem(f"{float(product['current_stock']):,.2f}"))
             
-            # Current Stock
-            current_stock = Decimal(str(product['current_stock'])).quantize(Decimal('0.01'))
-            self.table.setItem(row, 4, QTableWidgetItem(f"{current_stock:,.2f}"))
+            self.table.resizeColumnsToContents()
     
     def add_product(self):
         """Add new product"""
@@ -455,6 +749,7 @@ class ProductsWidget(QWidget):
         if ok and name:
             try:
                 self.db.execute_update('INSERT INTO products (name) VALUES (?)', (name,))
+                self.db.clear_lookup_cache()
                 self.load_products()
                 QMessageBox.information(self, "Success", "Product added successfully")
             except Exception as e:
@@ -520,6 +815,10 @@ class FarmersWidget(QWidget):
         layout.addWidget(self.table)
         self.setLayout(layout)
     
+    def refresh(self):
+        """Reload the table after the underlying data has changed"""
+        self.load_farmers()
+    
     def load_farmers(self):
         """Load farmers from database with statistics"""
         query = '''
@@ -539,8 +838,7 @@ class FarmersWidget(QWidget):
             self.table.setItem(row, 0, QTableWidgetItem(farmer['name']))
             
             # Date Added
-            date_obj = datetime.fromisoformat(farmer['created_at'])
-            date_str = date_obj.strftime("%d/%m/%Y")
+            date_str = _fmt_dt(farmer['created_at'], _DATE_FMT)
             self.table.setItem(row, 1, QTableWidgetItem(date_str))
             
             # Total Bought
@@ -553,6 +851,7 @@ class FarmersWidget(QWidget):
         if ok and name:
             try:
                 self.db.execute_update('INSERT INTO farmers (name) VALUES (?)', (name,))
+                self.db.clear_lookup_cache()
                 self.load_farmers()
                 QMessageBox.information(self, "Success", "Farmer added successfully")
             except Exception as e:
@@ -605,7 +904,7 @@ class TransferDialog(QDialog):
         
         # From farmer
         self.from_farmer_combo = QComboBox()
-        farmers = self.db.execute_query('SELECT id, name FROM farmers ORDER BY name')
+        farmers = self.db.get_farmers()
         for farmer in farmers:
             self.from_farmer_combo.addItem(farmer['name'], farmer['id'])
         form_layout.addRow("From Farmer:", self.from_farmer_combo)
@@ -618,7 +917,7 @@ class TransferDialog(QDialog):
         
         # Product
         self.product_combo = QComboBox()
-        products = self.db.execute_query('SELECT id, name FROM products ORDER BY name')
+        products = self.db.get_products()
         for product in products:
             self.product_combo.addItem(product['name'], product['id'])
         form_layout.addRow("Product:", self.product_combo)
@@ -690,14 +989,14 @@ class ReturnDialog(QDialog):
         
         # Farmer
         self.farmer_combo = QComboBox()
-        farmers = self.db.execute_query('SELECT id, name FROM farmers ORDER BY name')
+        farmers = self.db.get_farmers()
         for farmer in farmers:
             self.farmer_combo.addItem(farmer['name'], farmer['id'])
         form_layout.addRow("Farmer:", self.farmer_combo)
         
         # Product
         self.product_combo = QComboBox()
-        products = self.db.execute_query('SELECT id, name FROM products ORDER BY name')
+        products = self.db.get_products()
         for product in products:
             self.product_combo.addItem(product['name'], product['id'])
         form_layout.addRow("Product:", self.product_combo)
@@ -805,68 +1104,70 @@ class ReceiptsWidget(QWidget):
     
     def create_receipt_html(self, title: str, color: str) -> str:
         """Create HTML receipt template"""
-        current_time = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+        current_time = f"{datetime.now():{_TIMESTAMP_FMT}}"
         
-        html = f"""
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                .header {{ text-align: center; margin-bottom: 30px; }}
-                .title {{ font-size: 24px; font-weight: bold; color: {color}; }}
-                .date {{ font-size: 12px; color: #666; }}
-                .items {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
-                .items th, .items td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                .items th {{ background-color: #f2f2f2; }}
-                .total {{ font-weight: bold; font-size: 16px; text-align: right; margin-top: 20px; }}
-                .footer {{ margin-top: 40px; font-size: 12px; color: #666; text-align: center; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <div class="title">{title}</div>
-                <div class="date">Generated: {current_time}</div>
-            </div>
-            
-            <table class="items">
-                <thead>
-                    <tr>
-                        <th>Item</th>
-                        <th>Quantity</th>
-                        <th>Unit Price</th>
-                        <th>Subtotal</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    <tr>
-                        <td>Sample Product</td>
-                        <td>100</td>
-                        <td>DA 50.00</td>
-                        <td>DA 5,000.00</td>
-                    </tr>
-                </tbody>
-            </table>
-            
-            <div class="total">
-                Total: DA 5,000.00
-            </div>
-            
-            <div class="footer">
-                Thank you for your business!<br>
-                Shipment Management System
-            </div>
-        </body>
-        </html>
-        """
-        return html
+        rows = _RECEIPT_ROW_TMPL.substitute(
+            name="Sample Product", quantity=100,
+            unit_price="50.00", subtotal="5,000.00"
+        )
+        
+        return _RECEIPT_TMPL.substitute(
+            title=title,
+            css=_receipt_css(color),
+            subtitle=f"Generated: {current_time}",
+            info="",
+            rows=rows,
+            total="5,000.00"
+        )
 
 
-class ManageWidget(QWidget):
+class StockModel(QAbstractTableModel):
+    """Table model for the stock view; cells are formatted only when Qt asks for them"""
+    
+    COLUMNS = ('name', 'total_bought', 'total_sold', 'current_stock')
+    
+    def __init__(self, rows: Optional[List[Dict[str, Any]]] = None, parent=None):
+        super().__init__(parent)
+        self._rows = rows or []
+        self._headers = ["Product", "Total Bought", "Total Sold", "Current Stock"]
+    
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+    
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.COLUMNS)
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self._headers[section]
+        return super().headerData(section, orientation, role)
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        
+        item = self._rows[index.row()]
+        column = index.column()
+        if column == 0:
+            return item['name']
+        
+        # Display-only value, so plain float formatting is enough
+        return f"{float(item[self.COLUMNS[column]]):,.2f}"
+    
+    def set_rows(self, rows: List[Dict[str, Any]]):
+        """Replace the model contents with a fresh query result"""
+        self.beginResetModel()
+        self._rows = rows
+        self.endResetModel()
+
+
+class ManageWidget(_DeferredRefreshMixin, QWidget):
     """Stock management widget"""
     
     def __init__(self, db: Database):
         super().__init__()
         self.db = db
+        self._init_deferred_refresh(self._refresh_stock)
         self.init_ui()
         self.load_stock()
     
@@ -876,11 +1177,9 @@ class ManageWidget(QWidget):
         layout.addWidget(QLabel("<h2>Stock Management</h2>"))
         
         # Stock table
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels([
-            "Product", "Total Bought", "Total Sold", "Current Stock"
-        ])
+        self.model = StockModel(parent=self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         
         layout.addWidget(self.table)
         
@@ -912,51 +1211,33 @@ class ManageWidget(QWidget):
         # Load combo boxes
         self.load_combos()
     
+    def refresh(self):
+        """Reload the combos and stock table after the underlying data has changed"""
+        self.load_combos()
+        self.load_stock()
+    
     def load_combos(self):
         """Load farmers and products into combo boxes"""
         # Load farmers
-        farmers = self.db.execute_query('SELECT id, name FROM farmers ORDER BY name')
+        farmers = self.db.get_farmers()
         self.farmer_combo.clear()
         for farmer in farmers:
             self.farmer_combo.addItem(farmer['name'], farmer['id'])
         
         # Load products
-        products = self.db.execute_query('SELECT id, name FROM products ORDER BY name')
+        products = self.db.get_products()
         self.product_combo.clear()
         for product in products:
             self.product_combo.addItem(product['name'], product['id'])
     
     def load_stock(self):
-        """Load current stock for all products"""
-        query = '''
-            SELECT p.name,
-                   COALESCE(SUM(sp.quantity), 0) as total_bought,
-                   COALESCE(SUM(fp.quantity), 0) as total_sold,
-                   COALESCE(SUM(sp.quantity), 0) - 
-                   COALESCE(SUM(fp.quantity), 0) - 
-                   COALESCE(SUM(r.quantity), 0) as current_stock
-            FROM products p
-            LEFT JOIN shipment_products sp ON p.id = sp.product_id
-            LEFT JOIN farmer_purchases fp ON p.id = fp.product_id AND fp.shipment_id IS NOT NULL
-            LEFT JOIN returns r ON p.id = r.product_id
-            GROUP BY p.id
-            ORDER BY p.name
-        '''
-        
-        stock_data = self.db.execute_query(query)
-        
-        self.table.setRowCount(len(stock_data))
-        for row, item in enumerate(stock_data):
-            self.table.setItem(row, 0, QTableWidgetItem(item['name']))
-            
-            total_bought = Decimal(str(item['total_bought'])).quantize(Decimal('0.01'))
-            self.table.setItem(row, 1, QTableWidgetItem(f"{total_bought:,.2f}"))
-            
-            total_sold = Decimal(str(item['total_sold'])).quantize(Decimal('0.01'))
-            self.table.setItem(row, 2, QTableWidgetItem(f"{total_sold:,.2f}"))
-            
-            current_stock = Decimal(str(item['current_stock'])).quantize(Decimal('0.01'))
-            self.table.setItem(row, 3, QTableWidgetItem(f"{current_stock:,.2f}"))
+        """Load current stock for all products, deferring until shown if hidden"""
+        self._request_refresh()
+    
+    def _refresh_stock(self):
+        """Query stock levels and reset the table model"""
+        stock_data = self.db.execute_query(_SQL_STOCK)
+        self.model.set_rows(stock_data)
     
     def direct_sell(self):
         """Perform direct warehouse sale"""
@@ -978,7 +1259,8 @@ class ManageWidget(QWidget):
             ''', (farmer_id, product_id, quantity, unit_price, total_paid))
             
             QMessageBox.information(self, "Success", "Direct sale completed successfully")
-            self.load_stock()
+            # Stock only counts shipment sales (shipment_id IS NOT NULL), so a
+            # direct sale leaves the stock table unchanged; nothing to reload
             
             # Reset form
             self.quantity_spin.setValue(0)
@@ -995,6 +1277,9 @@ class AddShipmentDialog(QDialog):
         super().__init__(parent)
         self.db = db
         self.products = []
+        self._products_by_id: Dict[int, Dict[str, Any]] = {}
+        self._purchase_total = 0.0
+        self._sales_total = 0.0
         self.farmer_purchases = []
         self.current_product_idx = None
         self.init_ui()
@@ -1021,7 +1306,7 @@ class AddShipmentDialog(QDialog):
         product_form = QHBoxLayout()
         
         self.product_combo = QComboBox()
-        products = self.db.execute_query('SELECT id, name FROM products ORDER BY name')
+        products = self.db.get_products()
         for product in products:
             self.product_combo.addItem(product['name'], product['id'])
         
@@ -1062,7 +1347,7 @@ class AddShipmentDialog(QDialog):
         farmer_form = QHBoxLayout()
         
         self.farmer_combo = QComboBox()
-        farmers = self.db.execute_query('SELECT id, name FROM farmers ORDER BY name')
+        farmers = self.db.get_farmers()
         for farmer in farmers:
             self.farmer_combo.addItem(farmer['name'], farmer['id'])
         
@@ -1132,46 +1417,51 @@ class AddShipmentDialog(QDialog):
         subtotal = unit_price * quantity
         
         # Check if product already added
-        for product in self.products:
-            if product['product_id'] == product_id:
-                QMessageBox.warning(self, "Error", "Product already added to shipment")
-                return
+        if product_id in self._products_by_id:
+            QMessageBox.warning(self, "Error", "Product already added to shipment")
+            return
         
-        # Add to products list
-        self.products.append({
+        # Add to products list, keeping the id index in sync
+        product = {
             'product_id': product_id,
             'name': product_name,
             'unit_price': unit_price,
             'quantity': quantity,
             'subtotal': subtotal,
-            'farmers': []
-        })
+            'farmers': [],
+            'farmers_by_id': {},
+            'assigned_qty': 0.0
+        }
+        self.products.append(product)
+        self._products_by_id[product_id] = product
         
         # Update table
-        self.update_products_table()
+        self._append_product_row(product)
         
         # Reset form
         self.unit_price_spin.setValue(0)
         self.quantity_spin.setValue(1)
     
-    def update_products_table(self):
-        """Update products table display"""
-        self.products_table.setRowCount(len(self.products))
-        purchase_total = 0
+    def _append_product_row(self, product: Dict[str, Any]):
+        """Add a newly added product to the products table and purchase total"""
+        row = self.products_table.rowCount()
+        self.products_table.insertRow(row)
+        self.products_table.setItem(row, 0, QTableWidgetItem(product['name']))
+        self.products_table.setItem(row, 1, QTableWidgetItem(f"DA {product['unit_price']:.2f}"))
+        self.products_table.setItem(row, 2, QTableWidgetItem(str(product['quantity'])))
+        self.products_table.setItem(row, 3, QTableWidgetItem(f"DA {product['subtotal']:.2f}"))
         
-        for row, product in enumerate(self.products):
-            self.products_table.setItem(row, 0, QTableWidgetItem(product['name']))
-            self.products_table.setItem(row, 1, QTableWidgetItem(f"DA {product['unit_price']:.2f}"))
-            self.products_table.setItem(row, 2, QTableWidgetItem(str(product['quantity'])))
-            self.products_table.setItem(row, 3, QTableWidgetItem(f"DA {product['subtotal']:.2f}"))
-            
-            # Show farmers assigned
-            farmers_text = f"{len(product['farmers'])} farmers"
-            self.products_table.setItem(row, 4, QTableWidgetItem(farmers_text))
-            
-            purchase_total += product['subtotal']
+        # Show farmers assigned
+        farmers_text = f"{len(product['farmers'])} farmers"
+        self.products_table.setItem(row, 4, QTableWidgetItem(farmers_text))
         
-        self.purchase_total_label.setText(f"Purchase Total: DA {purchase_total:.2f}")
+        self._purchase_total += product['subtotal']
+        self.purchase_total_label.setText(f"Purchase Total: DA {self._purchase_total:.2f}")
+    
+    def _update_product_farmer_count(self, row: int):
+        """Refresh only the farmers-assigned cell of a product row"""
+        product = self.products[row]
+        self.products_table.item(row, 4).setText(f"{len(product['farmers'])} farmers")
     
     def select_product_for_farmers(self):
         """Select product for farmer assignment"""
@@ -1194,13 +1484,12 @@ class AddShipmentDialog(QDialog):
         product = self.products[self.current_product_idx]
         
         # Check if farmer already assigned to this product
-        for farmer in product['farmers']:
-            if farmer['farmer_id'] == farmer_id:
-                QMessageBox.warning(self, "Error", "Farmer already assigned to this product")
-                return
+        if farmer_id in product['farmers_by_id']:
+            QMessageBox.warning(self, "Error", "Farmer already assigned to this product")
+            return
         
         # Check if total quantity exceeds available
-        total_assigned = sum(f['quantity'] for f in product['farmers'])
+        total_assigned = product['assigned_qty']
         if total_assigned + quantity > product['quantity']:
             remaining = product['quantity'] - total_assigned
             QMessageBox.warning(self, "Error", f"Only {remaining:.2f} units remaining for this product")
@@ -1208,17 +1497,21 @@ class AddShipmentDialog(QDialog):
         
         # Add farmer assignment
         total_paid = quantity * selling_price
-        product['farmers'].append({
+        farmer = {
             'farmer_id': farmer_id,
             'farmer_name': farmer_name,
             'quantity': quantity,
             'unit_price': selling_price,
             'total_paid': total_paid
-        })
+        }
+        product['farmers'].append(farmer)
+        product['farmers_by_id'][farmer_id] = farmer
+        product['assigned_qty'] += quantity
+        self._sales_total += total_paid
         
         # Update tables
         self.update_farmers_table()
-        self.update_products_table()
+        self._update_product_farmer_count(self.current_product_idx)
         self.update_sales_total()
         
         # Reset form
@@ -1234,24 +1527,18 @@ class AddShipmentDialog(QDialog):
         
         product = self.products[self.current_product_idx]
         
-        for farmer in product['farmers']:
-            row = self.farmers_table.rowCount()
-            self.farmers_table.insertRow(row)
-            
-            self.farmers_table.setItem(row, 0, QTableWidgetItem(product['name']))
-            self.farmers_table.setItem(row, 1, QTableWidgetItem(farmer['farmer_name']))
-            self.farmers_table.setItem(row, 2, QTableWidgetItem(str(farmer['quantity'])))
-            self.farmers_table.setItem(row, 3, QTableWidgetItem(f"DA {farmer['unit_price']:.2f}"))
-            self.farmers_table.setItem(row, 4, QTableWidgetItem(f"DA {farmer['total_paid']:.2f}"))
+        with _batched_table_update(self.farmers_table):
+            self.farmers_table.setRowCount(len(product['farmers']))
+            for row, farmer in enumerate(product['farmers']):
+                self.farmers_table.setItem(row, 0, QTableWidgetItem(product['name']))
+                self.farmers_table.setItem(row, 1, QTableWidgetItem(farmer['farmer_name']))
+                self.farmers_table.setItem(row, 2, QTableWidgetItem(str(farmer['quantity'])))
+                self.farmers_table.setItem(row, 3, QTableWidgetItem(f"DA {farmer['unit_price']:.2f}"))
+                self.farmers_table.setItem(row, 4, QTableWidgetItem(f"DA {farmer['total_paid']:.2f}"))
     
     def update_sales_total(self):
         """Update sales total"""
-        sales_total = 0
-        for product in self.products:
-            for farmer in product['farmers']:
-                sales_total += farmer['total_paid']
-        
-        self.sales_total_label.setText(f"Sales Total: DA {sales_total:.2f}")
+        self.sales_total_label.setText(f"Sales Total: DA {self._sales_total:.2f}")
     
     def save_shipment(self):
         """Save shipment to database"""
@@ -1259,36 +1546,45 @@ class AddShipmentDialog(QDialog):
             QMessageBox.warning(self, "Error", "Please add at least one product")
             return
         
-        # Check if all products have farmer assignments
+        # Check that every product is fully assigned to farmers while
+        # collecting the rows to insert, so the products are walked once
+        product_rows = []
+        purchase_rows = []
         for product in self.products:
-            total_assigned = sum(f['quantity'] for f in product['farmers'])
+            total_assigned = product['assigned_qty']
             if total_assigned != product['quantity']:
                 QMessageBox.warning(self, "Error", f"Product '{product['name']}' has {product['quantity'] - total_assigned:.2f} units not assigned to farmers")
                 return
+            
+            product_rows.append((product['product_id'], product['unit_price'],
+                                 product['quantity'], product['subtotal']))
+            purchase_rows.extend(
+                (farmer['farmer_id'], product['product_id'], farmer['quantity'],
+                 farmer['unit_price'], farmer['total_paid'])
+                for farmer in product['farmers']
+            )
         
         try:
-            # Create shipment
             notes = self.notes_input.toPlainText()
-            shipment_id = self.db.execute_update(
-                'INSERT INTO shipments (notes) VALUES (?)',
-                (notes,)
-            )
             
-            # Add products to shipment
-            for product in self.products:
-                self.db.execute_update('''
+            # Write the shipment and all of its rows in a single transaction
+            with self.db.transaction():
+                shipment_id = self.db.execute_update(
+                    'INSERT INTO shipments (notes) VALUES (?)',
+                    (notes,)
+                )
+                
+                # Add products to shipment
+                self.db.executemany('''
                     INSERT INTO shipment_products (shipment_id, product_id, unit_price, quantity, subtotal)
                     VALUES (?, ?, ?, ?, ?)
-                ''', (shipment_id, product['product_id'], product['unit_price'], 
-                      product['quantity'], product['subtotal']))
+                ''', [(shipment_id,) + row for row in product_rows])
                 
                 # Add farmer purchases
-                for farmer in product['farmers']:
-                    self.db.execute_update('''
-                        INSERT INTO farmer_purchases (shipment_id, farmer_id, product_id, quantity, unit_price, total_paid)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (shipment_id, farmer['farmer_id'], product['product_id'],
-                          farmer['quantity'], farmer['unit_price'], farmer['total_paid']))
+                self.db.executemany('''
+                    INSERT INTO farmer_purchases (shipment_id, farmer_id, product_id, quantity, unit_price, total_paid)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', [(shipment_id,) + row for row in purchase_rows])
             
             QMessageBox.information(self, "Success", f"Shipment #{shipment_id} saved successfully with farmer assignments")
             self.accept()
@@ -1297,13 +1593,199 @@ class AddShipmentDialog(QDialog):
             QMessageBox.warning(self, "Error", f"Failed to save shipment: {e}")
 
 
-class ShipmentDetailsDialog(QDialog):
+@functools.lru_cache(maxsize=64)
+def _build_receipt_body(db: Database, shipment_id: int) -> Tuple[str, str, str]:
+    """Query and render the info block, rows and total of a shipment receipt.
+    
+    Saved shipments don't change, so the result is cached per shipment;
+    only the generation timestamp is filled in on each call.
+    """
+    # Get shipment details
+    shipment = db.execute_query(
+        'SELECT * FROM shipments WHERE id = ?',
+        (shipment_id,)
+    )[0]
+    
+    shipment_date = f"{datetime.fromisoformat(shipment['created_at']):{_DATETIME_FMT}}"
+    
+    # Get products
+    products = db.execute_query('''
+        SELECT p.name, sp.unit_price, sp.quantity, sp.subtotal
+        FROM shipment_products sp
+        JOIN products p ON sp.product_id = p.id
+        WHERE sp.shipment_id = ?
+    ''', (shipment_id,))
+    
+    total = sum(p['subtotal'] for p in products)
+    
+    info = _RECEIPT_INFO_TMPL.substitute(
+        shipment_date=shipment_date,
+        notes=shipment['notes'] or 'None'
+    )
+    
+    return info, _render_receipt_rows(products), f"{total:.2f}"
+
+
+def _render_shipment_receipt(db: Database, shipment_id: int, title: str, color: str) -> str:
+    """Build the full receipt HTML for a saved shipment"""
+    current_time = f"{datetime.now():{_TIMESTAMP_FMT}}"
+    info, rows, total = _build_receipt_body(db, shipment_id)
+    
+    return _RECEIPT_TMPL.substitute(
+        title=title,
+        css=_receipt_css(color),
+        subtitle=f"Receipt #{shipment_id} - {current_time}",
+        info=info,
+        rows=rows,
+        total=total
+    )
+
+
+class _ReceiptJobSignals(QObject):
+    """Signals for ReceiptJob; QRunnable itself can't emit signals"""
+    done = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+
+class ReceiptJob(QRunnable):
+    """Builds a shipment receipt on a thread-pool thread and emits the HTML"""
+    
+    def __init__(self, db: Database, shipment_id: int, title: str, color: str):
+        super().__init__()
+        self.db = db
+        self.shipment_id = shipment_id
+        self.title = title
+        self.color = color
+        self.signals = _ReceiptJobSignals()
+    
+    def run(self):
+        try:
+            html = _render_shipment_receipt(self.db, self.shipment_id, self.title, self.color)
+        except Exception as e:
+            logging.error(f"Failed to build receipt for shipment #{self.shipment_id}: {e}")
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.done.emit(html)
+
+
+class ShipmentProductsModel(QAbstractItemModel):
+    """Tree model of a shipment's products with their farmer assignments as children.
+    
+    Farmer rows are only queried the first time a product is expanded.
+    Product indexes carry internal id 0; farmer indexes carry their
+    product's row + 1.
+    """
+    
+    HEADERS = ["Product", "Unit Price", "Quantity", "Subtotal"]
+    
+    def __init__(self, db: Database, shipment_id: int, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.shipment_id = shipment_id
+        self._products: List[Dict[str, Any]] = []
+        self._farmers: Dict[int, List[Dict[str, Any]]] = {}
+    
+    def set_products(self, products: List[Dict[str, Any]]):
+        """Replace the product rows and forget any farmer rows already fetched"""
+        self.beginResetModel()
+        self._products = products
+        self._farmers = {}
+        self.endResetModel()
+    
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if parent.isValid():
+            return self.createIndex(row, column, parent.row() + 1)
+        return self.createIndex(row, column, 0)
+    
+    def parent(self, index):
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        return self.createIndex(index.internalId() - 1, 0, 0)
+    
+    def _is_product(self, index) -> bool:
+        return index.isValid() and index.internalId() == 0 and index.column() == 0
+    
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if not parent.isValid():
+            return len(self._products)
+        if self._is_product(parent):
+            return len(self._farmers.get(parent.row(), []))
+        return 0
+    
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return len(self.HEADERS)
+    
+    def hasChildren(self, parent=QModelIndex()) -> bool:
+        if not parent.isValid():
+            return bool(self._products)
+        if not self._is_product(parent):
+            return False
+        # Unfetched products report children so the view offers to expand them
+        return parent.row() not in self._farmers or bool(self._farmers[parent.row()])
+    
+    def canFetchMore(self, parent) -> bool:
+        return self._is_product(parent) and parent.row() not in self._farmers
+    
+    def fetchMore(self, parent):
+        if not self.canFetchMore(parent):
+            return
+        
+        row = parent.row()
+        farmers = self.db.execute_query('''
+            SELECT f.name, fp.quantity, fp.unit_price, fp.total_paid
+            FROM farmer_purchases fp
+            JOIN farmers f ON fp.farmer_id = f.id
+            WHERE fp.shipment_id = ? AND fp.product_id = ?
+            ORDER BY f.name
+        ''', (self.shipment_id, self._products[row]['product_id']))
+        
+        if not farmers:
+            self._farmers[row] = []
+            return
+        
+        self.beginInsertRows(parent, 0, len(farmers) - 1)
+        self._farmers[row] = farmers
+        self.endInsertRows()
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        
+        if index.internalId() == 0:
+            product = self._products[index.row()]
+            values = (
+                product['name'],
+                f"DA {product['unit_price']:.2f}",
+                str(product['quantity']),
+                f"DA {product['subtotal']:.2f}"
+            )
+        else:
+            farmer = self._farmers[index.internalId() - 1][index.row()]
+            values = (
+                farmer['name'],
+                f"DA {farmer['unit_price']:.2f}",
+                str(farmer['quantity']),
+                f"DA {farmer['total_paid']:.2f}"
+            )
+        return values[index.column()]
+
+
+class ShipmentDetailsDialog(_DeferredRefreshMixin, QDialog):
     """Dialog to view shipment details"""
     
     def __init__(self, db: Database, shipment_id: int, parent=None):
         super().__init__(parent)
         self.db = db
         self.shipment_id = shipment_id
+        self._init_deferred_refresh(self._refresh_shipment_details)
+        self._receipt_signals = set()
         self.init_ui()
         self.load_shipment_details()
     
@@ -1319,14 +1801,13 @@ class ShipmentDetailsDialog(QDialog):
         self.info_label = QLabel()
         layout.addWidget(self.info_label)
         
-        # Products table
+        # Products tree; expand a product to see the farmers it went to
         layout.addWidget(QLabel("<h3>Products</h3>"))
-        self.products_table = QTableWidget()
-        self.products_table.setColumnCount(4)
-        self.products_table.setHorizontalHeaderLabels([
-            "Product", "Unit Price", "Quantity", "Subtotal"
-        ])
-        layout.addWidget(self.products_table)
+        self.products_model = ShipmentProductsModel(self.db, self.shipment_id, self)
+        self.products_view = QTreeView()
+        self.products_view.setUniformRowHeights(True)
+        self.products_view.setModel(self.products_model)
+        layout.addWidget(self.products_view)
         
         # Receipt buttons
         receipt_layout = QHBoxLayout()
@@ -1350,15 +1831,18 @@ class ShipmentDetailsDialog(QDialog):
         self.setLayout(layout)
     
     def load_shipment_details(self):
-        """Load shipment details from database"""
+        """Load shipment details from database, deferring until shown if hidden"""
+        self._request_refresh()
+    
+    def _refresh_shipment_details(self):
+        """Query the shipment and its products and fill in the dialog"""
         # Get shipment info
         shipment = self.db.execute_query(
             'SELECT * FROM shipments WHERE id = ?',
             (self.shipment_id,)
         )[0]
         
-        date_obj = datetime.fromisoformat(shipment['created_at'])
-        date_str = date_obj.strftime("%d/%m/%Y %H:%M")
+        date_str = f"{datetime.fromisoformat(shipment['created_at']):{_DATETIME_FMT}}"
         
         self.info_label.setText(f"""
         <h3>Shipment #{shipment['id']}</h3>
@@ -1368,117 +1852,36 @@ class ShipmentDetailsDialog(QDialog):
         
         # Get products
         products = self.db.execute_query('''
-            SELECT p.name, sp.unit_price, sp.quantity, sp.subtotal
+            SELECT sp.product_id, p.name, sp.unit_price, sp.quantity, sp.subtotal
             FROM shipment_products sp
             JOIN products p ON sp.product_id = p.id
             WHERE sp.shipment_id = ?
         ''', (self.shipment_id,))
         
-        self.products_table.setRowCount(len(products))
-        for row, product in enumerate(products):
-            self.products_table.setItem(row, 0, QTableWidgetItem(product['name']))
-            self.products_table.setItem(row, 1, QTableWidgetItem(f"DA {product['unit_price']:.2f}"))
-            self.products_table.setItem(row, 2, QTableWidgetItem(str(product['quantity'])))
-            self.products_table.setItem(row, 3, QTableWidgetItem(f"DA {product['subtotal']:.2f}"))
+        self.products_model.set_products(products)
     
     def generate_factory_receipt(self):
         """Generate factory receipt"""
-        html = self.create_receipt_html("FACTORY PURCHASE RECEIPT", "blue")
-        self.show_receipt_dialog(html)
+        self.start_receipt_job("FACTORY PURCHASE RECEIPT", "blue")
     
     def generate_farmer_receipts(self):
         """Generate farmer receipts"""
-        html = self.create_receipt_html("FARMER SALE RECEIPT", "green")
-        self.show_receipt_dialog(html)
-    
-    def create_receipt_html(self, title: str, color: str) -> str:
-        """Create HTML receipt"""
-        current_time = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        
-        # Get shipment details
-        shipment = self.db.execute_query(
-            'SELECT * FROM shipments WHERE id = ?',
-            (self.shipment_id,)
-        )[0]
-        
-        date_obj = datetime.fromisoformat(shipment['created_at'])
-        shipment_date = date_obj.strftime("%d/%m/%Y %H:%M")
-        
-        # Get products
-        products = self.db.execute_query('''
-            SELECT p.name, sp.unit_price, sp.quantity, sp.subtotal
-            FROM shipment_products sp
-            JOIN products p ON sp.product_id = p.id
-            WHERE sp.shipment_id = ?
-        ''', (self.shipment_id,))
-        
-        total = sum(p['subtotal'] for p in products)
-        
-        html = f"""
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                .header {{ text-align: center; margin-bottom: 30px; }}
-                .title {{ font-size: 24px; font-weight: bold; color: {color}; }}
-                .date {{ font-size: 12px; color: #666; }}
-                .info {{ margin: 20px 0; }}
-                .items {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
-                .items th, .items td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                .items th {{ background-color: #f2f2f2; }}
-                .total {{ font-weight: bold; font-size: 16px; text-align: right; margin-top: 20px; }}
-                .footer {{ margin-top: 40px; font-size: 12px; color: #666; text-align: center; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <div class="title">{title}</div>
-                <div class="date">Receipt #{self.shipment_id} - {current_time}</div>
-            </div>
-            
-            <div class="info">
-                <strong>Shipment Date:</strong> {shipment_date}<br>
-                <strong>Notes:</strong> {shipment['notes'] or 'None'}
-            </div>
-            
-            <table class="items">
-                <thead>
-                    <tr>
-                        <th>Item</th>
-                        <th>Quantity</th>
-                        <th>Unit Price</th>
-                        <th>Subtotal</th>
-                    </tr>
-                </thead>
-                <tbody>
-        """
-        
-        for product in products:
-            html += f"""
-                    <tr>
-                        <td>{product['name']}</td>
-                        <td>{product['quantity']}</td>
-                        <td>DA {product['unit_price']:.2f}</td>
-                        <td>DA {product['subtotal']:.2f}</td>
-                    </tr>
-            """
-        
-        html += f"""
-                </tbody>
-            </table>
-            
-            <div class="total">
-                Total: DA {total:.2f}
-            </div>
-            
-            <div class="footer">
-                Thank you for your business!<br>
-                Shipment Management System
-            </div>
-        </body>
-        </html>
-        """
-        return html
+        self.start_receipt_job("FARMER SALE RECEIPT", "green")
+    
+    def start_receipt_job(self, title: str, color: str):
+        """Build a receipt in the background and show it when ready"""
+        job = ReceiptJob(self.db, self.shipment_id, title, color)
+        job.signals.done.connect(self.show_receipt_dialog)
+        job.signals.failed.connect(self.show_receipt_error)
+        # Keep the signal holder alive until the job has reported back
+        self._receipt_signals.add(job.signals)
+        job.signals.done.connect(lambda _html, s=job.signals: self._receipt_signals.discard(s))
+        job.signals.failed.connect(lambda _msg, s=job.signals: self._receipt_signals.discard(s))
+        QThreadPool.globalInstance().start(job)
+    
+    def show_receipt_error(self, message: str):
+        """Report a receipt that failed to build"""
+        QMessageBox.warning(self, "Error", f"Failed to generate receipt: {message}")
     
     def show_receipt_dialog(self, html: str):
         """Show receipt in a dialog"""
@@ -1506,6 +1909,10 @@ class MainWindow(QMainWindow):
     def __init__(self, db: Database):
         super().__init__()
         self.db = db
+        # One page per sidebar tab, created on first visit and kept around;
+        # _page_versions records the db.data_version each page last showed
+        self._pages: Dict[str, QWidget] = {}
+        self._page_versions: Dict[str, int] = {}
         self.init_ui()
         self.show_shipments()
     
@@ -1558,12 +1965,10 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(sidebar)
         
         # Main content area
-        self.content_area = QFrame()
-        self.content_area.setFrameShape(QFrame.Shape.Box)
-        self.content_layout = QVBoxLayout()
-        self.content_area.setLayout(self.content_layout)
+        self.stack = QStackedWidget()
+        self.stack.setFrameShape(QFrame.Shape.Box)
         
-        main_layout.addWidget(self.content_area)
+        main_layout.addWidget(self.stack)
         
         # Menu bar
         menubar = self.menuBar()
@@ -1597,52 +2002,51 @@ class MainWindow(QMainWindow):
         # Status bar
         self.statusBar().showMessage("Ready")
     
+    def _show_page(self, name: str, factory) -> QWidget:
+        """Switch to a page, building it on first use and refreshing it if data changed since"""
+        page = self._pages.get(name)
+        if page is None:
+            page = factory(self.db)
+            self._pages[name] = page
+            self.stack.addWidget(page)
+        elif self._page_versions[name] != self.db.data_version and hasattr(page, 'refresh'):
+            page.refresh()
+        self._page_versions[name] = self.db.data_version
+        self.stack.setCurrentWidget(page)
+        return page
+    
     def show_shipments(self):
         """Show shipments widget"""
-        self.clear_content()
-        self.shipments_widget = ShipmentsWidget(self.db)
-        self.content_layout.addWidget(self.shipments_widget)
+        self._show_page('shipments', ShipmentsWidget)
         self.statusBar().showMessage("Shipments")
     
     def show_products(self):
         """Show products widget"""
-        self.clear_content()
-        self.products_widget = ProductsWidget(self.db)
-        self.content_layout.addWidget(self.products_widget)
+        self._show_page('products', ProductsWidget)
         self.statusBar().showMessage("Products")
     
     def show_farmers(self):
         """Show farmers widget"""
-        self.clear_content()
-        self.farmers_widget = FarmersWidget(self.db)
-        self.content_layout.addWidget(self.farmers_widget)
+        self._show_page('farmers', FarmersWidget)
         self.statusBar().showMessage("Farmers")
     
     def show_receipts(self):
         """Show receipts widget"""
-        self.clear_content()
-        self.receipts_widget = ReceiptsWidget(self.db)
-        self.content_layout.addWidget(self.receipts_widget)
+        self._show_page('receipts', ReceiptsWidget)
         self.statusBar().showMessage("Receipts")
     
     def show_manage(self):
         """Show manage widget"""
-        self.clear_content()
-        self.manage_widget = ManageWidget(self.db)
-        self.content_layout.addWidget(self.manage_widget)
+        self._show_page('manage', ManageWidget)
         self.statusBar().showMessage("Stock Management")
     
-    def clear_content(self):
-        """Clear content area"""
-        while self.content_layout.count():
-            child = self.content_layout.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
-    
     def new_shipment(self):
         """Create new shipment"""
-        if hasattr(self, 'shipments_widget'):
-            self.shipments_widget.add_shipment()
+        # Pages live in self._pages for the window's lifetime, so this is
+        # either the live widget or None, never a deleted one
+        shipments_widget = self._pages.get('shipments')
+        if shipments_widget is not None:
+            shipments_widget.add_shipment()
     
     def print_current(self):
         """Print current view"""
@@ -1655,19 +2059,16 @@ class MainWindow(QMainWindow):
 
 def main():
     """Main application entry point"""
-    # Configure logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('shipment_manager.log'),
-            logging.StreamHandler()
-        ]
-    )
-    
-    # Create application
+    # Create application; only top-level windows need native handles
+    QApplication.setAttribute(Qt.ApplicationAttribute.AA_DontCreateNativeWidgetSiblings)
     app = QApplication(sys.argv)
-    app.setStyle(QStyleFactory.create("Fusion"))
+    
+    # Log through a background listener (see app_logging)
+    listener = setup_logging(app)
+    
+    # Style plugin discovery is slow on a cold start; do it once the event
+    # loop is running instead of before the login dialog is built
+    QTimer.singleShot(0, lambda: app.setStyle(QStyleFactory.create("Fusion")))
     
     # Create database
     db = Database()
@@ -1680,6 +2081,7 @@ def main():
         window.showMaximized()
         sys.exit(app.exec())
     else:
+        listener.stop()
         sys.exit(0)
 
 
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Logging setup shared by the application entry points (main.py and ShipmentManager.py)
+Records are queued by the calling thread and written out by a background
+listener, so logging never blocks the GUI on disk I/O.
+"""
+
+import atexit
+import queue
+import logging
+import logging.handlers
+import threading
+
+LOG_FILE = 'shipment_manager.log'
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_FLUSH_INTERVAL_S = 30
+
+
+def _flush_periodically(handler, stop_event, interval):
+    """Flush handler every interval seconds until stop_event is set"""
+    while not stop_event.wait(interval):
+        handler.flush()
+
+
+def setup_logging(app, log_file=LOG_FILE):
+    """Route root logging through a background listener tied to app's lifetime.
+
+    Returns the started QueueListener; it stops on app.aboutToQuit, so callers
+    only need to stop it themselves if they exit without running the event loop.
+    """
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setFormatter(formatter)
+    # Coalesce file writes; errors still go to disk immediately
+    buffered_file_handler = logging.handlers.MemoryHandler(
+        capacity=512, flushLevel=logging.ERROR,
+        target=file_handler, flushOnClose=True
+    )
+    atexit.register(buffered_file_handler.close)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    # basicConfig would give the QueueHandler its default format and prefix
+    # every message twice, so attach it to the root logger directly
+    log_queue = queue.Queue(-1)
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(
+        log_queue, buffered_file_handler, stream_handler, respect_handler_level=True
+    )
+    listener.start()
+    app.aboutToQuit.connect(listener.stop)
+
+    # Flush buffered log records at least every 30 seconds, from a daemon
+    # thread so the file write never lands on the GUI thread
+    stop_flushing = threading.Event()
+    threading.Thread(
+        target=_flush_periodically,
+        args=(buffered_file_handler, stop_flushing, LOG_FLUSH_INTERVAL_S),
+        name='log-flush', daemon=True
+    ).start()
+    app.aboutToQuit.connect(stop_flushing.set)
+
+    return listener
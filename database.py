@@ -8,7 +8,8 @@ Created by: [Person 1 Name]
 import sqlite3
 import hashlib
 import logging
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Iterator
 
 
 class Database:
@@ -16,21 +17,36 @@ class Database:
     
     def __init__(self, db_path: str = "shipments.db"):
         self.db_path = db_path
+        # One connection per thread (the GUI thread and each thread-pool
+        # worker): sqlite3 connections can't be shared across threads
+        self._local = threading.local()
         self.init_database()
     
     def get_connection(self) -> sqlite3.Connection:
         """Get database connection with foreign keys enabled"""
-        conn = sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(self.db_path, cached_statements=256)
         conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA synchronous = NORMAL")
         conn.row_factory = sqlite3.Row
         return conn
     
+    def _thread_connection(self) -> sqlite3.Connection:
+        """Long-lived connection for the calling thread, so prepared statements stay cached"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self.get_connection()
+        return conn
+    
     def init_database(self):
         """Initialize database with all tables"""
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
             
+            # WAL lets readers and the writer proceed concurrently; it is
+            # stored in the database file, so setting it once is enough
+            cursor.execute('PRAGMA journal_mode = WAL')
+            
             # Create all tables
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS products (
@@ -117,6 +133,11 @@ class Database:
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_farmer_purchases_shipment_id ON farmer_purchases(shipment_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_farmer_purchases_farmer_id ON farmer_purchases(farmer_id)')
             
+            # Product-side indexes for the per-product aggregates
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_shipment_products_product_id ON shipment_products(product_id, quantity)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_farmer_purchases_product_id ON farmer_purchases(product_id, shipment_id, quantity)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_returns_product_id ON returns(product_id, quantity)')
+            
             # Insert default admin user
             password_hash = hashlib.sha256("password123".encode()).hexdigest()
             cursor.execute('''
@@ -144,19 +165,28 @@ class Database:
     
     def execute_query(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
         """Execute SELECT query and return results"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        cursor = self._thread_connection().cursor()
         cursor.execute(query, params)
-        results = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return results
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def execute_query_iter(self, query: str, params: tuple = ()) -> Iterator[Dict[str, Any]]:
+        """Execute SELECT query and yield result rows one at a time"""
+        cursor = self._thread_connection().cursor()
+        try:
+            for row in cursor.execute(query, params):
+                yield dict(row)
+        finally:
+            cursor.close()
     
     def execute_update(self, query: str, params: tuple = ()) -> int:
         """Execute INSERT/UPDATE/DELETE query and return last row ID"""
-        conn = self.get_connection()
+        conn = self._thread_connection()
         cursor = conn.cursor()
-        cursor.execute(query, params)
+        try:
+            cursor.execute(query, params)
+        except Exception:
+            conn.rollback()
+            raise
         last_row_id = cursor.lastrowid
         conn.commit()
-        conn.close()
         return last_row_id
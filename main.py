@@ -6,17 +6,17 @@ Created by: Benbouzid Khireddine
 """
 
 import sys
-import logging
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QFrame, QStyleFactory
+    QPushButton, QFrame, QStyleFactory, QStackedWidget
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtWidgets import QDialog
 
-from database import Database
-from ui_widgets_1 import ShipmentsWidget, ProductsWidget
-from ui_widgets_2 import FarmersWidget, LoginDialog
+from app_logging import setup_logging
+
+# Widget modules and the database layer are imported where they are first
+# needed, so the application and login dialog come up sooner on a cold start
 
 
 class MainWindow(QMainWindow):
@@ -25,6 +25,8 @@ class MainWindow(QMainWindow):
     def __init__(self, db):
         super().__init__()
         self.db = db
+        # One page per sidebar tab, created on first visit and kept around
+        self._pages = {}
         self.init_ui()
         self.show_shipments()
     
@@ -67,43 +69,44 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(sidebar)
         
         # Main content area
-        self.content_area = QFrame()
-        self.content_area.setFrameShape(QFrame.Shape.Box)
-        self.content_layout = QVBoxLayout()
-        self.content_area.setLayout(self.content_layout)
+        self.stack = QStackedWidget()
+        self.stack.setFrameShape(QFrame.Shape.Box)
         
-        main_layout.addWidget(self.content_area)
+        main_layout.addWidget(self.stack)
         
         self.statusBar().showMessage("Ready")
     
+    def _show_page(self, name, factory):
+        """Switch to a page, building it with factory() on first use"""
+        page = self._pages.get(name)
+        if page is None:
+            page = factory(self.db)
+            self._pages[name] = page
+            self.stack.addWidget(page)
+        self.stack.setCurrentWidget(page)
+        return page
+    
     def show_shipments(self):
         """Show shipments widget"""
-        self.clear_content()
-        self.shipments_widget = ShipmentsWidget(self.db)
-        self.content_layout.addWidget(self.shipments_widget)
+        from ui_widgets_1 import ShipmentsWidget
+        
+        self._show_page('shipments', ShipmentsWidget)
         self.statusBar().showMessage("Shipments")
     
     def show_products(self):
         """Show products widget"""
-        self.clear_content()
-        self.products_widget = ProductsWidget(self.db)
-        self.content_layout.addWidget(self.products_widget)
+        from ui_widgets_1 import ProductsWidget
+        
+        self._show_page('products', ProductsWidget)
         self.statusBar().showMessage("Products")
     
     def show_farmers(self):
         """Show farmers widget"""
-        self.clear_content()
-        self.farmers_widget = FarmersWidget(self.db)
-        self.content_layout.addWidget(self.farmers_widget)
+        from ui_widgets_2 import FarmersWidget
+        
+        self._show_page('farmers', FarmersWidget)
         self.statusBar().showMessage("Farmers")
     
-    def clear_content(self):
-        """Clear content area"""
-        while self.content_layout.count():
-            child = self.content_layout.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
-    
     def logout(self):
         """Logout and return to login screen"""
         self.close()
@@ -111,17 +114,18 @@ class MainWindow(QMainWindow):
 
 def main():
     """Main application entry point"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('shipment_manager.log'),
-            logging.StreamHandler()
-        ]
-    )
-    
+    # Only top-level windows need native handles; skipping the siblings
+    # saves native window allocations while the dialogs are built
+    QApplication.setAttribute(Qt.ApplicationAttribute.AA_DontCreateNativeWidgetSiblings)
     app = QApplication(sys.argv)
-    app.setStyle(QStyleFactory.create("Fusion"))
+    listener = setup_logging(app)
+    
+    # Style plugin discovery is slow on a cold start; do it once the event
+    # loop is running instead of before the login dialog is built
+    QTimer.singleShot(0, lambda: app.setStyle(QStyleFactory.create("Fusion")))
+    
+    from database import Database
+    from ui_widgets_2 import LoginDialog
     
     db = Database()
     
@@ -131,6 +135,7 @@ def main():
         window.showMaximized()
         sys.exit(app.exec())
     else:
+        listener.stop()
         sys.exit(0)
 
 
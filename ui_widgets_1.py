@@ -4,19 +4,20 @@ UI Widgets Module 1 - Shipments and Products (Hardened)
 Handles shipments and products interface components with added security
 Created by: Maou Houssem Eddine
 Improvements: error handling, input validation, duplicate prevention,
-safe date/decimal parsing, logging, numeric alignment, role checks.
+safe date parsing, logging, numeric alignment, role checks.
 """
 
 import logging
-import traceback
+from functools import lru_cache
 from datetime import datetime
-from decimal import Decimal, InvalidOperation
 
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget,
-    QTableWidgetItem, QLabel, QMessageBox, QHeaderView, QInputDialog
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QTableView,
+    QLabel, QMessageBox, QHeaderView, QInputDialog
+)
+from PyQt6.QtCore import (
+    Qt, QAbstractTableModel, QModelIndex, QObject, QRunnable, QThreadPool, pyqtSignal
 )
-from PyQt6.QtCore import Qt
 
 # ---------------------------
 # Logging configuration
@@ -34,18 +35,14 @@ logger = logging.getLogger("ui_widgets_1")
 # ---------------------------
 
 MAX_INPUT_LENGTH = 200  # limit for user input strings
+ROWS_BATCH_SIZE = 500  # rows handed to the GUI thread per signal while streaming
 CURRENCY_LABEL = "DA"
 
 
-def safe_decimal(value, default=Decimal("0.00")):
-    """Safely convert a value to Decimal rounded to 2 decimal places."""
-    try:
-        # If value is already Decimal, str() will keep precision
-        d = Decimal(str(value))
-        return d.quantize(Decimal("0.01"))
-    except (InvalidOperation, TypeError, ValueError) as e:
-        logger.warning("safe_decimal conversion failed for value=%r: %s", value, e)
-        return default
+@lru_cache(maxsize=4096)
+def _fmt_dt(iso, fmt):
+    """Parse and format one timestamp; many rows share the same value."""
+    return datetime.fromisoformat(iso).strftime(fmt)
 
 
 def safe_date_format(iso_str, fmt="%d/%m/%Y %H:%M", default="Unknown"):
@@ -55,18 +52,228 @@ def safe_date_format(iso_str, fmt="%d/%m/%Y %H:%M", default="Unknown"):
     try:
         # Accept both "YYYY-MM-DD HH:MM:SS" and ISO "T" formats
         # datetime.fromisoformat accepts both "YYYY-MM-DDTHH:MM:SS" and "YYYY-MM-DD HH:MM:SS"
-        dt = datetime.fromisoformat(str(iso_str))
-        return dt.strftime(fmt)
+        return _fmt_dt(str(iso_str), fmt)
     except Exception as e:
         logger.warning("safe_date_format failed for %r: %s", iso_str, e)
         return "Invalid Date"
 
 
 def show_db_error(parent, heading, exc):
-    """Show DB error to user (non-sensitive) and log full traceback."""
+    """Show DB error to user (non-sensitive) and log it.
+
+    The full traceback is logged where the error was raised, which may be a
+    worker thread, so only the heading and error text are logged here.
+    """
     msg = f"{heading}.\nSee log for details."
     QMessageBox.critical(parent, "Database Error", msg)
-    logger.error("%s\n%s", heading, traceback.format_exc())
+    logger.error("%s: %s", heading, exc)
+
+
+# ---------------------------
+# SQL
+# ---------------------------
+# Built once at import. The text is identical on every call, so a
+# long-lived connection's statement cache can reuse the prepared statement.
+
+_SQL_SHIPMENTS = '''
+    SELECT s.id, s.created_at, s.notes,
+           COUNT(DISTINCT sp.product_id) as product_count,
+           COUNT(DISTINCT fp.farmer_id) as farmer_count,
+           COALESCE(SUM(fp.total_paid), 0) as total_paid
+    FROM shipments s
+    LEFT JOIN shipment_products sp ON s.id = sp.shipment_id
+    LEFT JOIN farmer_purchases fp ON s.id = fp.shipment_id
+    GROUP BY s.id
+    ORDER BY s.created_at DESC
+'''
+
+# Aggregate each child table on its own before joining; joining them all
+# first multiplies every SUM by the row counts of the others
+_SQL_PRODUCTS = '''
+    WITH sp_agg AS (
+        SELECT product_id, SUM(quantity) as q, SUM(subtotal) as c
+        FROM shipment_products
+        GROUP BY product_id
+    ),
+    fp_agg AS (
+        SELECT product_id, SUM(quantity) as q
+        FROM farmer_purchases
+        GROUP BY product_id
+    ),
+    r_agg AS (
+        SELECT product_id, SUM(quantity) as q
+        FROM returns
+        GROUP BY product_id
+    )
+    SELECT p.id, p.name, p.created_at,
+           COALESCE(sp.q, 0) as total_bought,
+           COALESCE(sp.c, 0) as total_cost,
+           COALESCE(sp.q, 0) - COALESCE(fp.q, 0) - COALESCE(r.q, 0) as current_stock
+    FROM products p
+    LEFT JOIN sp_agg sp ON sp.product_id = p.id
+    LEFT JOIN fp_agg fp ON fp.product_id = p.id
+    LEFT JOIN r_agg r ON r.product_id = p.id
+    ORDER BY p.name
+'''
+
+
+class _QuerySignals(QObject):
+    """Signals for _QueryRunnable (QRunnable can't emit signals itself)"""
+    rows_ready = pyqtSignal(int, list)
+    failed = pyqtSignal(int, str)
+    finished = pyqtSignal(int)
+
+
+class _QueryRunnable(QRunnable):
+    """Stream a query's rows from a thread-pool thread back to the GUI in batches.
+
+    fetch must only touch the database and return an iterable of rows. Each
+    batch goes out on rows_ready, failed reports an error, and finished
+    follows once the iterable is exhausted (or has failed). All carry
+    request_id so the widget can ignore results from superseded loads.
+    """
+
+    def __init__(self, request_id, fetch):
+        super().__init__()
+        self.request_id = request_id
+        self.fetch = fetch
+        self.signals = _QuerySignals()
+
+    def run(self):
+        batch = []
+        try:
+            for row in self.fetch():
+                batch.append(row)
+                if len(batch) >= ROWS_BATCH_SIZE:
+                    self.signals.rows_ready.emit(self.request_id, batch)
+                    batch = []
+        except Exception as e:
+            # keep whatever arrived before the failure
+            logger.exception("Background query failed (request %d)", self.request_id)
+            if batch:
+                self.signals.rows_ready.emit(self.request_id, batch)
+                batch = []
+            self.signals.failed.emit(self.request_id, str(e))
+        if batch:
+            self.signals.rows_ready.emit(self.request_id, batch)
+        self.signals.finished.emit(self.request_id)
+
+
+def _amount(value, suffix=""):
+    """Format a numeric column for display; float is enough for a 2dp string."""
+    text = f"{float(value or 0):,.2f}"
+    return f"{text} {suffix}" if suffix else text
+
+
+class _RowsModel(QAbstractTableModel):
+    """Read-only table model over query rows; cells are formatted only when painted.
+
+    columns is a sequence of (header, formatter, right_aligned) where
+    formatter(row) returns the cell's display text.
+    """
+
+    def __init__(self, columns, rows=None, parent=None):
+        super().__init__(parent)
+        self._columns = list(columns)
+        self._rows = list(rows or [])
+        self._loading = False
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        # a single placeholder row while a load is in flight
+        return 1 if self._loading else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._columns)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self._columns[section][0]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+
+        _header, formatter, right_aligned = self._columns[index.column()]
+        if role == Qt.ItemDataRole.TextAlignmentRole and right_aligned:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+
+        if self._loading:
+            return "Loading..." if index.column() == 0 else None
+
+        row = self._rows[index.row()]
+        try:
+            return formatter(row)
+        except Exception:
+            logger.exception("Failed to render %s row: %s", type(self).__name__, row)
+            # placeholder keeps the table consistent
+            return "Error" if index.column() == 0 else None
+
+    def set_loading(self):
+        """Show the 'Loading...' placeholder row until rows arrive."""
+        self.beginResetModel()
+        self._rows = []
+        self._loading = True
+        self.endResetModel()
+
+    def append_rows(self, rows):
+        """Add a batch of streamed rows; the first batch replaces the placeholder."""
+        if self._loading:
+            self.set_rows(rows)
+            return
+        if not rows:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    def finish_loading(self):
+        """Drop the placeholder if the load produced no rows at all."""
+        if self._loading:
+            self.set_rows([])
+
+    def set_rows(self, rows):
+        """Replace the model contents with a fresh query result."""
+        self.beginResetModel()
+        self._rows = list(rows)
+        self._loading = False
+        self.endResetModel()
+
+
+class ShipmentsModel(_RowsModel):
+    """Shipments list: one row per shipment with its aggregate totals"""
+
+    # defensive get with defaults
+    COLUMNS = (
+        ("ID", lambda s: str(s.get('id', 'N/A')), False),
+        ("Date", lambda s: safe_date_format(s.get('created_at'), fmt="%d/%m/%Y %H:%M", default="Unknown"), False),
+        ("Products", lambda s: f"{int(s.get('product_count', 0) or 0)} products", False),
+        ("Customers", lambda s: f"{int(s.get('farmer_count', 0) or 0)} farmers", False),
+        (f"Total Paid ({CURRENCY_LABEL})", lambda s: _amount(s.get('total_paid'), CURRENCY_LABEL), True),
+    )
+
+    def __init__(self, rows=None, parent=None):
+        super().__init__(self.COLUMNS, rows, parent)
+
+
+class ProductsModel(_RowsModel):
+    """Products list: one row per product with purchase and stock totals"""
+
+    COLUMNS = (
+        ("Name", lambda p: str(p.get('name', 'Unnamed')), False),
+        ("Date Added", lambda p: safe_date_format(p.get('created_at'), fmt="%d/%m/%Y", default="Unknown"), False),
+        ("Total Bought", lambda p: _amount(p.get('total_bought')), True),
+        ("Total Cost", lambda p: _amount(p.get('total_cost'), CURRENCY_LABEL), True),
+        ("Current Stock", lambda p: _amount(p.get('current_stock')), True),
+    )
+
+    def __init__(self, rows=None, parent=None):
+        super().__init__(self.COLUMNS, rows, parent)
 
 
 # ---------------------------
@@ -78,13 +285,16 @@ class ShipmentsWidget(QWidget):
 
     def __init__(self, db, current_user=None):
         """
-        db: an object exposing execute_query(query, params=()) -> list[dict]
+        db: an object exposing execute_query(query, params=()) -> list[dict],
+                         execute_query_iter(query, params=()) -> iterator of dict
                          and execute_update(query, params=()) -> last_row_id/None
         current_user: optional dict e.g. {'username': 'admin', 'role': 'admin'}
         """
         super().__init__()
         self.db = db
         self.current_user = current_user or {'username': 'guest', 'role': 'viewer'}
+        self._load_request_id = 0
+        self._load_signals = None
         self.init_ui()
         self.load_shipments()
 
@@ -102,100 +312,60 @@ class ShipmentsWidget(QWidget):
 
         layout.addLayout(header_layout)
 
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels([
-            "ID", "Date", "Products", "Customers", f"Total Paid ({CURRENCY_LABEL})"
-        ])
-        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.model = ShipmentsModel(parent=self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
 
+        # Interactive + one resizeColumnsToContents() per load; ResizeToContents
+        # would re-measure the column on every model change
         header = self.table.horizontalHeader()
-        header.setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
-        header.setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
         header.setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
-        header.setSectionResizeMode(3, QHeaderView.ResizeMode.ResizeToContents)
-        header.setSectionResizeMode(4, QHeaderView.ResizeMode.ResizeToContents)
 
         layout.addWidget(self.table)
         self.setLayout(layout)
 
-    def _safe_query(self, query, params=()):
-        """Execute a query safely and return results or [] on failure."""
-        try:
-            return self.db.execute_query(query, params) if params else self.db.execute_query(query)
-        except Exception as e:
-            logger.exception("DB query failed: %s | params=%r", query, params)
-            return []
-
     def load_shipments(self):
-        """Load shipments from database with error handling"""
-        query = '''
-            SELECT s.id, s.created_at, s.notes,
-                   COUNT(DISTINCT sp.product_id) as product_count,
-                   COUNT(DISTINCT fp.farmer_id) as farmer_count,
-                   COALESCE(SUM(fp.total_paid), 0) as total_paid
-            FROM shipments s
-            LEFT JOIN shipment_products sp ON s.id = sp.shipment_id
-            LEFT JOIN farmer_purchases fp ON s.id = fp.shipment_id
-            GROUP BY s.id
-            ORDER BY s.created_at DESC
-        '''
-        try:
-            shipments = self._safe_query(query) or []
-        except Exception as e:
-            show_db_error(self, "Failed to load shipments", e)
-            shipments = []
+        """Load shipments from database in the background with error handling"""
+        self._load_request_id += 1
+        runnable = _QueryRunnable(self._load_request_id, lambda: self.db.execute_query_iter(_SQL_SHIPMENTS))
+        runnable.signals.rows_ready.connect(self._append_shipments)
+        runnable.signals.failed.connect(self._shipments_failed)
+        runnable.signals.finished.connect(self._shipments_loaded)
+        # keep the signal holder alive until its rows have been delivered
+        self._load_signals = runnable.signals
+
+        self.model.set_loading()
+        QThreadPool.globalInstance().start(runnable)
+
+    def _append_shipments(self, request_id, shipments):
+        """Add a batch of loaded shipments to the table (runs on the GUI thread)"""
+        if request_id != self._load_request_id:
+            return  # a newer load has been started since
 
         # defensive: ensure it's a list
         if not isinstance(shipments, (list, tuple)):
             logger.error("load_shipments expected list, got %s", type(shipments))
-            shipments = []
-
-        self.table.setRowCount(len(shipments))
-
-        for row, shipment in enumerate(shipments):
-            try:
-                # defensive get with defaults
-                shipment_id = shipment.get('id', 'N/A')
-                created_at = shipment.get('created_at', None)
-                product_count = shipment.get('product_count', 0) or 0
-                farmer_count = shipment.get('farmer_count', 0) or 0
-                total_paid_raw = shipment.get('total_paid', 0) or 0
-
-                # ID
-                item_id = QTableWidgetItem(str(shipment_id))
-                item_id.setFlags(item_id.flags() ^ Qt.ItemFlag.ItemIsEditable)
-                self.table.setItem(row, 0, item_id)
-
-                # Date
-                date_str = safe_date_format(created_at, fmt="%d/%m/%Y %H:%M", default="Unknown")
-                item_date = QTableWidgetItem(date_str)
-                item_date.setFlags(item_date.flags() ^ Qt.ItemFlag.ItemIsEditable)
-                self.table.setItem(row, 1, item_date)
-
-                # Product count
-                item_prod = QTableWidgetItem(f"{int(product_count)} products")
-                item_prod.setFlags(item_prod.flags() ^ Qt.ItemFlag.ItemIsEditable)
-                self.table.setItem(row, 2, item_prod)
-
-                # Farmer count
-                item_farmer = QTableWidgetItem(f"{int(farmer_count)} farmers")
-                item_farmer.setFlags(item_farmer.flags() ^ Qt.ItemFlag.ItemIsEditable)
-                self.table.setItem(row, 3, item_farmer)
-
-                # Total paid (numeric alignment, safe decimal)
-                total_paid = safe_decimal(total_paid_raw)
-                item_paid = QTableWidgetItem(f"{total_paid:,.2f} {CURRENCY_LABEL}")
-                item_paid.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-                item_paid.setFlags(item_paid.flags() ^ Qt.ItemFlag.ItemIsEditable)
-                self.table.setItem(row, 4, item_paid)
-
-            except Exception:
-                logger.exception("Failed to render shipment row: %s", shipment)
-                # show placeholder in row to keep table consistent
-                self.table.setItem(row, 0, QTableWidgetItem("Error"))
-                continue
+            return
+
+        self.model.append_rows(shipments)
+
+    def _shipments_failed(self, request_id, error):
+        """Report a failed load, unless a newer load has replaced it"""
+        if request_id == self._load_request_id:
+            show_db_error(self, "Failed to load shipments", error)
+
+    def _shipments_loaded(self, request_id):
+        """Finish a load once every batch has been delivered"""
+        if request_id == self._load_request_id:
+            self.model.finish_loading()
+            self.table.resizeColumnsToContents()
+
+    def refresh(self):
+        """Reload the table after the underlying data has changed"""
+        self.load_shipments()
 
     def add_shipment(self):
         """Open dialog to add new shipment (requires proper role)"""
@@ -223,6 +393,8 @@ class ProductsWidget(QWidget):
         super().__init__()
         self.db = db
         self.current_user = current_user or {'username': 'guest', 'role': 'viewer'}
+        self._load_request_id = 0
+        self._load_signals = None
         self.init_ui()
         self.load_products()
 
@@ -240,100 +412,59 @@ class ProductsWidget(QWidget):
 
         layout.addLayout(header_layout)
 
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels([
-            "Name", "Date Added", "Total Bought", "Total Cost", "Current Stock"
-        ])
-        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.model = ProductsModel(parent=self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
 
+        # Columns are fitted once per load rather than on every model change
         header = self.table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
         header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
-        header.setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
-        header.setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents)
-        header.setSectionResizeMode(3, QHeaderView.ResizeMode.ResizeToContents)
-        header.setSectionResizeMode(4, QHeaderView.ResizeMode.ResizeToContents)
 
         layout.addWidget(self.table)
         self.setLayout(layout)
 
-    def _safe_query(self, query, params=()):
-        """Execute a query safely and return results or [] on failure."""
-        try:
-            return self.db.execute_query(query, params) if params else self.db.execute_query(query)
-        except Exception:
-            logger.exception("DB query failed: %s | params=%r", query, params)
-            return []
-
     def load_products(self):
-        """Load products from database with statistics and robust handling"""
-        query = '''
-            SELECT p.id, p.name, p.created_at,
-                   COALESCE(SUM(sp.quantity), 0) as total_bought,
-                   COALESCE(SUM(sp.subtotal), 0) as total_cost,
-                   COALESCE(SUM(sp.quantity), 0) - 
-                   COALESCE(SUM(fp.quantity), 0) - 
-                   COALESCE(SUM(r.quantity), 0) as current_stock
-            FROM products p
-            LEFT JOIN shipment_products sp ON p.id = sp.product_id
-            LEFT JOIN farmer_purchases fp ON p.id = fp.product_id
-            LEFT JOIN returns r ON p.id = r.product_id
-            GROUP BY p.id
-            ORDER BY p.name
-        '''
-        try:
-            products = self._safe_query(query) or []
-        except Exception as e:
-            show_db_error(self, "Failed to load products", e)
-            products = []
+        """Load products with statistics in the background and robust handling"""
+        self._load_request_id += 1
+        runnable = _QueryRunnable(self._load_request_id, lambda: self.db.execute_query_iter(_SQL_PRODUCTS))
+        runnable.signals.rows_ready.connect(self._append_products)
+        runnable.signals.failed.connect(self._products_failed)
+        runnable.signals.finished.connect(self._products_loaded)
+        # keep the signal holder alive until its rows have been delivered
+        self._load_signals = runnable.signals
+
+        self.model.set_loading()
+        QThreadPool.globalInstance().start(runnable)
+
+    def _append_products(self, request_id, products):
+        """Add a batch of loaded products to the table (runs on the GUI thread)"""
+        if request_id != self._load_request_id:
+            return  # a newer load has been started since
 
+        # defensive: ensure it's a list
         if not isinstance(products, (list, tuple)):
             logger.error("load_products expected list, got %s", type(products))
-            products = []
-
-        self.table.setRowCount(len(products))
-
-        for row, product in enumerate(products):
-            try:
-                name = product.get('name', 'Unnamed') if isinstance(product, dict) else str(product)
-                created_at = product.get('created_at', None)
-                total_bought_raw = product.get('total_bought', 0) or 0
-                total_cost_raw = product.get('total_cost', 0) or 0
-                current_stock_raw = product.get('current_stock', 0) or 0
-
-                item_name = QTableWidgetItem(str(name))
-                item_name.setFlags(item_name.flags() ^ Qt.ItemFlag.ItemIsEditable)
-                self.table.setItem(row, 0, item_name)
-
-                date_str = safe_date_format(created_at, fmt="%d/%m/%Y", default="Unknown")
-                item_date = QTableWidgetItem(date_str)
-                item_date.setFlags(item_date.flags() ^ Qt.ItemFlag.ItemIsEditable)
-                self.table.setItem(row, 1, item_date)
-
-                total_bought = safe_decimal(total_bought_raw)
-                item_bought = QTableWidgetItem(f"{total_bought:,.2f}")
-                item_bought.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-                item_bought.setFlags(item_bought.flags() ^ Qt.ItemFlag.ItemIsEditable)
-                self.table.setItem(row, 2, item_bought)
-
-                total_cost = safe_decimal(total_cost_raw)
-                item_cost = QTableWidgetItem(f"{total_cost:,.2f} {CURRENCY_LABEL}")
-                item_cost.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-                item_cost.setFlags(item_cost.flags() ^ Qt.ItemFlag.ItemIsEditable)
-                self.table.setItem(row, 3, item_cost)
-
-                current_stock = safe_decimal(current_stock_raw)
-                item_stock = QTableWidgetItem(f"{current_stock:,.2f}")
-                item_stock.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-                item_stock.setFlags(item_stock.flags() ^ Qt.ItemFlag.ItemIsEditable)
-                self.table.setItem(row, 4, item_stock)
-
-            except Exception:
-                logger.exception("Failed to render product row: %s", product)
-                # fallback placeholders
-                self.table.setItem(row, 0, QTableWidgetItem("Error"))
-                continue
+            return
+
+        self.model.append_rows(products)
+
+    def _products_failed(self, request_id, error):
+        """Report a failed load, unless a newer load has replaced it"""
+        if request_id == self._load_request_id:
+            show_db_error(self, "Failed to load products", error)
+
+    def _products_loaded(self, request_id):
+        """Finish a load once every batch has been delivered"""
+        if request_id == self._load_request_id:
+            self.model.finish_loading()
+            self.table.resizeColumnsToContents()
+
+    def refresh(self):
+        """Reload the table after the underlying data has changed"""
+        self.load_products()
 
     def _product_exists(self, name):
         """Check whether a product name already exists (case-insensitive)."""
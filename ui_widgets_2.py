@@ -71,6 +71,10 @@ class FarmersWidget(QWidget):
             total_bought = Decimal(str(farmer['total_bought'])).quantize(Decimal('0.01'))
             self.table.setItem(row, 2, QTableWidgetItem(f"{total_bought:,.2f} DA"))
     
+    def refresh(self):
+        """Reload the table after the underlying data has changed"""
+        self.load_farmers()
+    
     def add_farmer(self):
         """Add new farmer"""
         name, ok = QInputDialog.getText(self, "Add Farmer", "Enter farmer name:")